@@ -1,15 +1,29 @@
 """
 Test script to validate text processing without running TTS generation.
 This helps verify the batching, normalization, and splitting logic.
+Token counts need tokenizer.json from the Hugging Face Hub; when it cannot be
+loaded, chunking falls back to characters. The length_fn checks use a stub
+and need no network access.
 """
 
+import io
+from contextlib import redirect_stdout
 from pathlib import Path
 from tts_batch_processor import (
     process_text_into_chunks,
     normalize_text,
+    describe_chunk_size,
     convert_acronyms,
     convert_numbers_and_decimals,
+    chunk_token_budget,
+    batch_sentences,
+    split_long_sentence,
+    count_tokens,
+    get_tokenizer,
+    token_budget_active,
 )
+from chatterbox.tts import punc_norm
+import tts_batch_processor
 
 
 def test_file(file_path: Path):
@@ -33,7 +47,7 @@ def test_file(file_path: Path):
     print(f"{'=' * 80}")
 
     for i, chunk in enumerate(chunks):
-        print(f"\n--- Chunk {i:02d} ({len(chunk)} chars) ---")
+        print(f"\n--- Chunk {i:02d} ({describe_chunk_size(chunk)}) ---")
         print(chunk)
         print(f"--- End Chunk {i:02d} ---")
 
@@ -61,6 +75,158 @@ def test_normalization():
         print(f"Normalized: {normalized}")
 
 
+def test_token_budget():
+    """Check that MAX_CHUNK_SECONDS caps the token budget per chunk."""
+    print(f"\n{'=' * 80}")
+    print("Testing Token Budget")
+    print(f"{'=' * 80}")
+
+    # Defaults: the audio-length cap (20s * 14 tokens/s) is below BATCH_SIZE_TOKENS
+    assert chunk_token_budget() == 280
+
+    original_seconds = tts_batch_processor.MAX_CHUNK_SECONDS
+    try:
+        tts_batch_processor.MAX_CHUNK_SECONDS = 10
+        assert chunk_token_budget() == 140
+        tts_batch_processor.MAX_CHUNK_SECONDS = 60
+        assert chunk_token_budget() == tts_batch_processor.BATCH_SIZE_TOKENS
+    finally:
+        tts_batch_processor.MAX_CHUNK_SECONDS = original_seconds
+
+    print("Token budget OK")
+
+
+def test_batch_sentences_counts_separators():
+    """Check that separators between sentences count towards the chunk size."""
+    print(f"\n{'=' * 80}")
+    print("Testing Batch Sizing")
+    print(f"{'=' * 80}")
+
+    # Stub tokenizer: one token per character, spaces included
+    sentences = ["a" * 50, "b" * 50, "c" * 50]
+    chunks = batch_sentences(sentences, 150, length_fn=len)
+
+    assert all(len(chunk) <= 150 for chunk in chunks)
+    assert chunks == ["a" * 50 + " " + "b" * 50, "c" * 50]
+
+    print("Batch sizing OK")
+
+
+def word_count(text: str) -> int:
+    """Stub length_fn: one token per word."""
+    return len(text.split())
+
+
+def test_length_fn_chunking():
+    """Check splitting and batching with a stub length_fn instead of characters."""
+    print(f"\n{'=' * 80}")
+    print("Testing length_fn Chunking")
+    print(f"{'=' * 80}")
+
+    words = [f"word{i}" for i in range(12)]
+    parts = split_long_sentence(" ".join(words), 4, length_fn=word_count)
+    assert parts == [" ".join(words[i : i + 4]) for i in range(0, 12, 4)]
+
+    # Splits at natural break points before falling back to spaces
+    parts = split_long_sentence("one two three, four five six", 3, word_count)
+    assert parts == ["one two three", "four five six"]
+
+    chunks = batch_sentences(["a b", "c d", "e f g", "h"], 4, word_count, 0)
+    assert chunks == ["a b c d", "e f g h"]
+
+    # Each join costs separator_length on top of the sentence sizes
+    chunks = batch_sentences(["a b", "c", "d e"], 4, word_count, 1)
+    assert chunks == ["a b c", "d e"]
+
+    print("length_fn chunking OK")
+
+
+class StubTokenizer:
+    """Character-level stand-in for EnTokenizer: one token per character."""
+
+    def __init__(self, vocab_file_path: str):
+        self.vocab_file_path = vocab_file_path
+
+    def encode(self, text: str) -> list:
+        return list(text)
+
+
+def offline_download(**kwargs):
+    """Stand-in for hf_hub_download when the Hub cannot be reached."""
+    raise OSError("Hub unreachable")
+
+
+def use_tokenizer_stubs(download, tokenizer_cls) -> tuple:
+    """Install stubs for the tokenizer download and reset the cached tokenizer."""
+    originals = (tts_batch_processor.hf_hub_download, tts_batch_processor.EnTokenizer)
+    tts_batch_processor.hf_hub_download = download
+    tts_batch_processor.EnTokenizer = tokenizer_cls
+    tts_batch_processor._tokenizer = None
+    tts_batch_processor._tokenizer_unavailable = False
+    count_tokens.cache_clear()
+    return originals
+
+
+def restore_tokenizer(originals: tuple) -> None:
+    """Undo use_tokenizer_stubs."""
+    use_tokenizer_stubs(*originals)
+
+
+def test_token_chunking():
+    """Check token counting and token-mode chunking with a stub tokenizer."""
+    print(f"\n{'=' * 80}")
+    print("Testing Token Chunking")
+    print(f"{'=' * 80}")
+
+    originals = use_tokenizer_stubs(lambda **kwargs: "tokenizer.json", StubTokenizer)
+    original_budget = tts_batch_processor.BATCH_SIZE_TOKENS
+    try:
+        assert token_budget_active()
+        assert count_tokens("hello world") == len(punc_norm("hello world"))
+
+        text = "The CPU has 16GB of RAM. " * 20 + ("and then some more, " * 30)
+        for budget in (280, 60):
+            # A small BATCH_SIZE_TOKENS shows the token limits are the ones used
+            tts_batch_processor.BATCH_SIZE_TOKENS = budget
+            chunks = process_text_into_chunks(text)
+            limit = chunk_token_budget()
+            assert limit == min(budget, 280)
+            assert all(
+                tts_batch_processor._count_tokens_raw(chunk) <= limit
+                for chunk in chunks
+            )
+        assert count_tokens.cache_info().hits > 0
+    finally:
+        tts_batch_processor.BATCH_SIZE_TOKENS = original_budget
+        restore_tokenizer(originals)
+
+    print("Token chunking OK")
+
+
+def test_tokenizer_fallback():
+    """Check that chunking falls back to characters when the download fails."""
+    print(f"\n{'=' * 80}")
+    print("Testing Tokenizer Fallback")
+    print(f"{'=' * 80}")
+
+    originals = use_tokenizer_stubs(offline_download, StubTokenizer)
+    try:
+        output = io.StringIO()
+        with redirect_stdout(output):
+            assert get_tokenizer() is None
+        assert "Falling back to character-based chunk sizes." in output.getvalue()
+        assert not token_budget_active()
+
+        chunks = process_text_into_chunks("Hello there, world. " * 40)
+        limit = tts_batch_processor.BATCH_SIZE_CHARS
+        assert all(len(chunk) <= limit for chunk in chunks)
+        assert describe_chunk_size(chunks[0]).endswith("chars")
+    finally:
+        restore_tokenizer(originals)
+
+    print("Tokenizer fallback OK")
+
+
 if __name__ == "__main__":
     print("=" * 80)
     print("TTS BATCH PROCESSOR - TEXT PROCESSING TEST")
@@ -69,6 +235,13 @@ if __name__ == "__main__":
     # Test normalization
     test_normalization()
 
+    # Test token budgeting
+    test_token_budget()
+    test_batch_sentences_counts_separators()
+    test_length_fn_chunking()
+    test_token_chunking()
+    test_tokenizer_fallback()
+
     # Test file processing
     input_dir = Path("input_texts")
     txt_files = list(input_dir.glob("*.txt"))
@@ -1,12 +1,16 @@
 import torch
 import torchaudio as ta
 import perth
-from chatterbox.tts import ChatterboxTTS
+from chatterbox.tts import ChatterboxTTS, REPO_ID, punc_norm
+from chatterbox.models.tokenizers import EnTokenizer
+from huggingface_hub import hf_hub_download
 import os
 import re
+from bisect import bisect_right
+from functools import lru_cache
 from pathlib import Path
 from datetime import datetime
-from typing import List, Tuple
+from typing import Callable, List, Optional, Tuple
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
 import warnings
@@ -24,6 +28,17 @@ BATCH_SIZE_CHARS = 300  # Target characters per chunk
 MIN_SENTENCE_LENGTH = 30  # Merge sentences shorter than this when batching is off
 LONG_SENTENCE_THRESHOLD = 500  # Split sentences longer than this
 
+# Token budgeting (measures chunks with the model's own text tokenizer)
+ENABLE_TOKEN_BUDGET = True  # When False, fall back to the character limits above
+BATCH_SIZE_TOKENS = 300  # Upper limit on text tokens per chunk
+# The model stops after 1000 speech tokens at 25 Hz, i.e. 40s of audio
+MAX_CHUNK_SECONDS = 20  # Expected audio per chunk, half the model's limit
+# The tokenizer is near character level (704 entries, one token per space) and
+# speech runs at about 14 characters per second
+TEXT_TOKENS_PER_SECOND = 14  # Speaking rate used to estimate audio length
+# Chunk budget = min(BATCH_SIZE_TOKENS, MAX_CHUNK_SECONDS * TEXT_TOKENS_PER_SECOND)
+TOKEN_CACHE_SIZE = 4096  # Sentences whose token counts are memoized
+
 # Parallel processing
 MAX_PARALLEL_CHUNKS = 2  # Number of chunks to process simultaneously
 
@@ -237,10 +252,21 @@ def split_into_sentences(text: str) -> List[str]:
 
 
 def split_long_sentence(
-    sentence: str, max_length: int = LONG_SENTENCE_THRESHOLD
+    sentence: str,
+    max_length: int = LONG_SENTENCE_THRESHOLD,
+    length_fn: Callable[[str], int] = len,
+    probe_fn: Optional[Callable[[str], int]] = None,
 ) -> List[str]:
-    """Recursively split long sentences at natural break points."""
-    if len(sentence) <= max_length:
+    """Recursively split long sentences at natural break points.
+
+    Size is measured with length_fn (characters by default, or count_tokens).
+    Candidate prefixes are measured with probe_fn (defaults to length_fn), so
+    a cached length_fn can be paired with an uncached probe.
+    """
+    if probe_fn is None:
+        probe_fn = length_fn
+
+    if length_fn(sentence) <= max_length:
         return [sentence]
 
     # Try to split at natural break points in order of preference
@@ -262,19 +288,24 @@ def split_long_sentence(
                 right = sentence[best_pos + len(char) :].strip()
 
                 # Recursively split if still too long
-                return split_long_sentence(left, max_length) + split_long_sentence(
-                    right, max_length
-                )
+                return split_long_sentence(
+                    left, max_length, length_fn, probe_fn
+                ) + split_long_sentence(right, max_length, length_fn, probe_fn)
 
-    # If no natural break point, split by character count at last space
+    # If no natural break point, split at the last space that fits the limit
     if " " in sentence:
-        split_pos = sentence.rfind(" ", 0, max_length)
+        spaces = [i for i, c in enumerate(sentence) if c == " "]
+        # Count of spaces whose prefix fits, i.e. probe_fn(prefix) <= max_length
+        fits = bisect_right(
+            spaces, max_length, key=lambda pos: probe_fn(sentence[:pos])
+        )
+        split_pos = spaces[fits - 1] if fits > 0 else -1
         if split_pos > 0:
             left = sentence[:split_pos].strip()
             right = sentence[split_pos:].strip()
-            return split_long_sentence(left, max_length) + split_long_sentence(
-                right, max_length
-            )
+            return split_long_sentence(
+                left, max_length, length_fn, probe_fn
+            ) + split_long_sentence(right, max_length, length_fn, probe_fn)
 
     # Last resort: just return the sentence
     return [sentence]
@@ -302,9 +333,16 @@ def merge_short_sentences(
 
 
 def batch_sentences(
-    sentences: List[str], target_size: int = BATCH_SIZE_CHARS
+    sentences: List[str],
+    target_size: int = BATCH_SIZE_CHARS,
+    length_fn: Callable[[str], int] = len,
+    separator_length: int = 1,
 ) -> List[str]:
-    """Group sentences into chunks of approximately target_size characters."""
+    """Group sentences into chunks of approximately target_size.
+
+    Size is measured per sentence with length_fn (characters by default, or
+    count_tokens), plus separator_length for each space joining two sentences.
+    """
     if not sentences:
         return []
 
@@ -313,14 +351,18 @@ def batch_sentences(
     current_length = 0
 
     for sentence in sentences:
-        sentence_length = len(sentence)
+        sentence_length = length_fn(sentence)
 
         # If adding this sentence would exceed target, start a new batch
-        if current_batch and (current_length + sentence_length > target_size):
+        if current_batch and (
+            current_length + separator_length + sentence_length > target_size
+        ):
             batches.append(" ".join(current_batch))
             current_batch = []
             current_length = 0
 
+        if current_batch:
+            current_length += separator_length
         current_batch.append(sentence)
         current_length += sentence_length
 
@@ -339,20 +381,107 @@ def process_text_into_chunks(text: str) -> List[str]:
     # Split into sentences
     sentences = split_into_sentences(text)
 
+    # Measure in model tokens or characters based on configuration
+    if token_budget_active():
+        length_fn = count_tokens
+        probe_fn = _count_tokens_raw
+        batch_limit = chunk_token_budget()
+        # A single sentence becomes its own chunk, so it must fit the budget too
+        long_limit = batch_limit
+    else:
+        length_fn = len
+        probe_fn = len
+        long_limit = LONG_SENTENCE_THRESHOLD
+        batch_limit = BATCH_SIZE_CHARS
+
     # Split long sentences recursively
     processed_sentences = []
     for sentence in sentences:
-        processed_sentences.extend(split_long_sentence(sentence))
+        processed_sentences.extend(
+            split_long_sentence(sentence, long_limit, length_fn, probe_fn)
+        )
 
     # Apply batching or merging based on configuration
     if ENABLE_BATCHING:
-        chunks = batch_sentences(processed_sentences, BATCH_SIZE_CHARS)
+        # One space joins sentences: one character, or one [SPACE] token
+        chunks = batch_sentences(processed_sentences, batch_limit, length_fn, 1)
     else:
         chunks = merge_short_sentences(processed_sentences, MIN_SENTENCE_LENGTH)
 
     return chunks
 
 
+# ============================================================================
+# TOKEN COUNTING
+# ============================================================================
+
+# Thread-safe tokenizer initialization
+_tokenizer = None
+_tokenizer_unavailable = False
+_tokenizer_lock = threading.Lock()
+
+
+def get_tokenizer() -> Optional[EnTokenizer]:
+    """Get or load the TTS text tokenizer without loading the acoustic model.
+
+    Returns None if tokenizer.json cannot be loaded (e.g. offline with an empty
+    Hugging Face cache), in which case chunking falls back to characters.
+    """
+    global _tokenizer, _tokenizer_unavailable
+
+    if _tokenizer is None and not _tokenizer_unavailable:
+        with _tokenizer_lock:
+            if _tokenizer is None and not _tokenizer_unavailable:
+                if _model is not None:
+                    # Reuse the tokenizer of an already loaded model
+                    _tokenizer = _model.tokenizer
+                else:
+                    try:
+                        # Only tokenizer.json is fetched, not the model weights
+                        vocab_path = hf_hub_download(
+                            repo_id=REPO_ID, filename="tokenizer.json"
+                        )
+                        _tokenizer = EnTokenizer(vocab_path)
+                    except Exception as e:
+                        _tokenizer_unavailable = True
+                        print(f"Could not load TTS tokenizer: {e}")
+                        print("Falling back to character-based chunk sizes.")
+
+    return _tokenizer
+
+
+def token_budget_active() -> bool:
+    """Whether chunks are sized in model tokens rather than characters."""
+    return ENABLE_TOKEN_BUDGET and get_tokenizer() is not None
+
+
+def _count_tokens_raw(text: str) -> int:
+    """Count model text tokens, normalized the same way generate() does."""
+    return len(get_tokenizer().encode(punc_norm(text)))
+
+
+# Memoized per sentence; one-off prefixes and chunks use _count_tokens_raw
+count_tokens = lru_cache(maxsize=TOKEN_CACHE_SIZE)(_count_tokens_raw)
+
+
+def estimate_audio_seconds(token_count: int) -> float:
+    """Estimate the audio duration produced by token_count text tokens."""
+    return token_count / TEXT_TOKENS_PER_SECOND
+
+
+def chunk_token_budget() -> int:
+    """Token budget per chunk, capped so audio stays under MAX_CHUNK_SECONDS."""
+    return min(BATCH_SIZE_TOKENS, int(MAX_CHUNK_SECONDS * TEXT_TOKENS_PER_SECOND))
+
+
+def describe_chunk_size(chunk: str) -> str:
+    """Describe a chunk's size in the units used for chunking."""
+    if token_budget_active():
+        tokens = _count_tokens_raw(chunk)
+        return f"{tokens} tokens, ~{estimate_audio_seconds(tokens):.0f}s"
+    return f"{len(chunk)} chars"
+
+
 # ============================================================================
 # TTS GENERATION
 # ============================================================================
@@ -474,7 +603,7 @@ def process_text_file(input_path: Path) -> None:
 
     # Show chunk preview
     for i, chunk in enumerate(chunks):
-        print(f"  Chunk {i:02d} ({len(chunk)} chars): {chunk[:80]}...")
+        print(f"  Chunk {i:02d} ({describe_chunk_size(chunk)}): {chunk[:80]}...")
 
     # Create output filename base
     timestamp = datetime.now().strftime("%Y%m%d-%H%M")
@@ -512,7 +641,10 @@ def process_all_text_files():
     print(f"{'=' * 80}")
     print(f"Configuration:")
     print(f"  Batching: {'Enabled' if ENABLE_BATCHING else 'Disabled'}")
-    print(f"  Batch size: {BATCH_SIZE_CHARS} characters")
+    if token_budget_active():
+        print(f"  Batch size: {chunk_token_budget()} tokens")
+    else:
+        print(f"  Batch size: {BATCH_SIZE_CHARS} characters")
     print(f"  Parallel workers: {MAX_PARALLEL_CHUNKS}")
     print(f"  Voice sample: {AUDIO_PROMPT_PATH}")
     print(f"  Found {len(txt_files)} text file(s)")